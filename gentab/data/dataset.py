@@ -1,23 +1,421 @@
-from gentab.utils import console, ProgressBar
+from gentab.utils import console, ProgressBar, DEVICE
 from gentab import SEED
 
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any, Literal, Optional, Union, cast, Tuple, Dict, List
 
 import pandas as pd
-import dask.dataframe as dd
+from pandas.api.types import is_bool_dtype, is_float_dtype, is_integer_dtype
 import numpy as np
 import torch
 import sklearn.datasets
 from sklearn.preprocessing import LabelEncoder, OneHotEncoder
-from sklearn.model_selection import train_test_split
-from scipy.stats import wasserstein_distance, entropy
-from scipy.spatial.distance import jensenshannon
-from dython.nominal import theils_u
+from scipy.stats import entropy
+from scipy.special import rel_entr
+from scipy.spatial import cKDTree
 from imblearn.datasets import fetch_datasets
 from ucimlrepo import fetch_ucirepo
 
+# Candidate dtypes for reduce_mem_df(), narrowest first
+_INT_TYPES = (np.int8, np.int16, np.int32, np.int64)
+_INT_MAXES = np.array([np.iinfo(t).max for t in _INT_TYPES])
+_FLOAT_TYPES = (np.float32, np.float64)
+_FLOAT_MAXES = np.array([np.finfo(t).max for t in _FLOAT_TYPES[:-1]], dtype=float)
+
+# Maximum number of query rows processed at once by the distance kernels
+BLOCK_SIZE = 4096
+# Maximum number of elements of the temporaries allocated per block
+BLOCK_ELEMENTS = 2**24
+# Per core cache budget the column blocks of the JSD/Wasserstein kernels
+# keep their working set in, half of a typical 1 MiB L2
+CACHE_BYTES = 2**19
+# Up to this many columns a k-d tree beats the blocked brute force search
+KDTREE_MAX_DIMS = 16
+
+
+def _block_rows(n_elements: int) -> int:
+    return int(max(1, min(BLOCK_SIZE, BLOCK_ELEMENTS // max(n_elements, 1))))
+
+
+def _block_columns(n_rows: int, row_bytes: int) -> int:
+    # Columns whose temporaries, row_bytes per row each, fit the cache budget
+    return int(max(1, CACHE_BYTES // max(n_rows * row_bytes, 1)))
+
+
+def _blocked_nearest(Q: np.ndarray, R: np.ndarray, k: int, w=None) -> np.ndarray:
+    # Euclidean distances to the k nearest rows of R, sorted. Candidates are
+    # picked in float64 with |r|^2 - 2 q.r (|q|^2 does not change the order)
+    # and their distances recomputed from the differences, so near duplicates
+    # keep their exact small distances
+    w = np.ones(Q.shape[1]) if w is None else np.asarray(w, dtype=np.float64)
+    R = R.astype(np.float64) / w
+    mu = R.mean(axis=0)
+    R -= mu
+    sq_r = np.einsum("ij,ij->i", R, R)
+
+    out = np.empty((len(Q), k))
+    step = _block_rows(len(R))
+
+    for start in range(0, len(Q), step):
+        rows = slice(start, start + step)
+        Qb = Q[rows].astype(np.float64) / w - mu
+        idx = np.argpartition(sq_r - 2 * (Qb @ R.T), k - 1, axis=1)[:, :k]
+
+        diff = Qb[:, np.newaxis, :] - R[idx]
+        out[rows] = np.sort(np.sqrt(np.einsum("ijk,ijk->ij", diff, diff)), axis=1)
+
+    return out
+
+
+def _pairwise_min(Q: np.ndarray, R: np.ndarray, w=None) -> np.ndarray:
+    return _blocked_nearest(Q, R, 1, w)[:, 0]
+
+
+def _pairwise_min2(Q: np.ndarray, R: np.ndarray, w=None) -> np.ndarray:
+    return _blocked_nearest(Q, R, 2, w)
+
+
+def _row_keys(A: np.ndarray) -> np.ndarray:
+    # Dense integer key per distinct row, codes are merged one column at a
+    # time and re-densified so the combined key never overflows
+    keys = np.zeros(len(A), dtype=np.int64)
+
+    for k in range(A.shape[1]):
+        _, codes = np.unique(A[:, k], return_inverse=True)
+        _, keys = np.unique(keys * (codes.max() + 1) + codes, return_inverse=True)
+
+    return keys.ravel()
+
+
+def _pairwise_hits(Q: np.ndarray, R: np.ndarray, thres: np.ndarray) -> np.ndarray:
+    # A row is a hit if any row of R is within thres in every column. The
+    # columns that must match exactly are packed into one key per row so a
+    # single comparison covers all of them, the rest are checked one at a
+    # time keeping the temporaries at one boolean per pair of rows
+    exact = thres == 0
+    keys = _row_keys(np.concatenate([Q[:, exact], R[:, exact]]))
+    keys_q, keys_r = keys[: len(Q)], keys[len(Q) :]
+    Qc, Rc, thres_c = Q[:, ~exact], R[:, ~exact], thres[~exact]
+
+    hits = np.empty(len(Q), dtype=bool)
+    step = _block_rows(len(R))
+
+    for start in range(0, len(Q), step):
+        rows = slice(start, start + step)
+        mask = keys_q[rows, np.newaxis] == keys_r[np.newaxis, :]
+
+        for k in range(Qc.shape[1]):
+            if not mask.any():
+                break
+            mask &= np.abs(Qc[rows, k, np.newaxis] - Rc[np.newaxis, :, k]) <= thres_c[k]
+
+        hits[rows] = mask.any(axis=1)
+
+    return hits
+
+
+def _parallel_rows(func, Q: np.ndarray, *args, n_jobs: int = 1) -> np.ndarray:
+    # Contiguous slices of the query rows are handed to threads sharing the
+    # other inputs, BLAS and the numpy sorts and ufuncs release the GIL so
+    # threads run in parallel. Inputs fitting in a single block are not worth
+    # splitting
+    if n_jobs <= 1 or len(Q) <= BLOCK_SIZE:
+        return func(Q, *args)
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        parts = executor.map(lambda Qp: func(Qp, *args), np.array_split(Q, n_jobs))
+
+        return np.concatenate(list(parts))
+
+
+def _parallel_columns(func, A: np.ndarray, B: np.ndarray, n_jobs: int = 1):
+    # Per column kernels on contiguous column ranges, see _parallel_rows
+    if n_jobs <= 1 or A.shape[1] <= 1:
+        return func(A, B)
+
+    bounds = np.linspace(0, A.shape[1], min(n_jobs, A.shape[1]) + 1, dtype=int)
+    cols = [slice(lo, hi) for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+    with ThreadPoolExecutor(max_workers=len(cols)) as executor:
+        parts = executor.map(lambda c: func(A[:, c], B[:, c]), cols)
+
+        return np.concatenate(list(parts))
+
+
+def _pairwise_topk_torch(
+    Q: torch.Tensor, R: torch.Tensor, k: int, w=None
+) -> torch.Tensor:
+    if w is not None:
+        Q, R = Q / w, R / w
+
+    mu = R.mean(dim=0)
+    Q, R = Q - mu, R - mu
+    step = _block_rows(len(R))
+
+    return torch.cat(
+        [
+            torch.topk(
+                # Direct differences, the matrix product form loses near
+                # duplicates to cancellation in single precision
+                torch.cdist(
+                    Q[start : start + step],
+                    R,
+                    compute_mode="donot_use_mm_for_euclid_dist",
+                ),
+                k=k,
+                dim=1,
+                largest=False,
+            ).values
+            for start in range(0, len(Q), step)
+        ]
+    )
+
+
+def _pairwise_hits_torch(
+    Q: torch.Tensor, R: torch.Tensor, thres: torch.Tensor
+) -> torch.Tensor:
+    step = _block_rows(R.numel())
+
+    return torch.cat(
+        [
+            ((Q[start : start + step].unsqueeze(1) - R).abs() <= thres)
+            .all(dim=-1)
+            .any(dim=-1)
+            for start in range(0, len(Q), step)
+        ]
+    )
+
+
+def _sweep_gen_to_real(Q, R, n_jobs: int = 1, tree: Optional[cKDTree] = None):
+    # Two closest real records of every synthetic row
+    if isinstance(Q, torch.Tensor):
+        return _pairwise_topk_torch(Q, R, 2)
+    elif tree is not None:
+        return tree.query(Q, k=2, workers=-1)[0]
+
+    return _parallel_rows(_pairwise_min2, Q, R, n_jobs=n_jobs)
+
+
+def _sweep_real_to_all(R, F, thres, w, n_jobs: int = 1):
+    # Hits against the synthetic rows, closest synthetic record and closest
+    # real record other than the row itself
+    if isinstance(R, torch.Tensor):
+        return (
+            _pairwise_hits_torch(R, F, thres),
+            _pairwise_topk_torch(R, F, 1, w)[:, 0],
+            _pairwise_topk_torch(R, R, 2, w)[:, 1],
+        )
+
+    return (
+        _parallel_rows(_pairwise_hits, R, F, thres, n_jobs=n_jobs),
+        _parallel_rows(_pairwise_min, R, F, w, n_jobs=n_jobs),
+        _parallel_rows(_pairwise_min2, R, R, w, n_jobs=n_jobs)[:, 1],
+    )
+
+
+def _corr_ratio(fcat: np.ndarray, meas: np.ndarray, k: int) -> float:
+    # Single sweep accumulating per category counts and sums, rows with a
+    # missing category (-1 code) only contribute to the denominator
+    valid = fcat >= 0
+    n_array = np.bincount(fcat[valid], minlength=k)
+    s_array = np.bincount(fcat[valid], weights=meas[valid], minlength=k)
+
+    y_total_avg = s_array.sum() / n_array.sum()
+    numerator = np.sum(n_array * (s_array / n_array - y_total_avg) ** 2)
+    denominator = np.sum((meas - y_total_avg) ** 2)
+
+    return 0.0 if numerator == 0 else numerator / denominator
+
+
+def _jensen_shannon(P: np.ndarray, Q: np.ndarray) -> np.ndarray:
+    # Column wise scipy.spatial.distance.jensenshannon, every column of P and
+    # Q is normalized to a distribution before mixing. Blocks of columns are
+    # swept once through scratch buffers allocated for the first block
+    n, k = P.shape
+    psum = P.sum(axis=0, dtype=np.float64)
+    qsum = Q.sum(axis=0, dtype=np.float64)
+
+    # A column without mass on one side is at the maximum distance sqrt(ln 2)
+    # and at zero when both sides are empty, scipy would return nan
+    out = np.where((psum == 0) & (qsum == 0), 0.0, np.sqrt(np.log(2)))
+    valid = np.flatnonzero((psum != 0) & (qsum != 0))
+    if len(valid) < k:
+        P, Q, psum, qsum = P[:, valid], Q[:, valid], psum[valid], qsum[valid]
+    res = np.empty(len(valid))
+
+    # Half precision inputs are only upcast one block at a time
+    dtype = np.promote_types(np.result_type(P, Q), np.float32)
+    step = _block_columns(n, 3 * dtype.itemsize)
+    scratch = [
+        np.empty((n, min(step, len(valid))), dtype=dtype, order="F") for _ in range(3)
+    ]
+
+    for start in range(0, len(valid), step):
+        cols = slice(start, start + step)
+        p, q, m = (buf[:, : len(res[cols])] for buf in scratch)
+
+        np.divide(P[:, cols], psum[cols], out=p, casting="unsafe")
+        np.divide(Q[:, cols], qsum[cols], out=q, casting="unsafe")
+        np.add(p, q, out=m)
+        m *= 0.5
+        # Keeps the logarithm away from float32 underflow
+        np.maximum(m, np.finfo(dtype).tiny, out=m)
+
+        js = res[cols]
+        np.sum(rel_entr(p, m, out=p), axis=0, dtype=np.float64, out=js)
+        js += rel_entr(q, m, out=q).sum(axis=0, dtype=np.float64)
+        js *= 0.5
+        np.sqrt(js, out=js)
+
+    out[valid] = res
+
+    return out
+
+
+def _jensen_shannon_codes(P: np.ndarray, Q: np.ndarray) -> np.ndarray:
+    # Categorical columns hold small non negative integer codes, so every row
+    # term of the divergence only depends on its (p, q) code pair. The pairs
+    # are counted once and the logarithms evaluated on the k x k table, the
+    # other columns go through the blocked dense kernel in a single call
+    if len(P) != len(Q):
+        raise ValueError(
+            f"Jensen Shannon compares row aligned columns, got {len(P)} real "
+            f"and {len(Q)} generated rows"
+        )
+
+    lo = np.minimum(P.min(axis=0, initial=0), Q.min(axis=0, initial=0))
+    hi = np.maximum(P.max(axis=0, initial=0), Q.max(axis=0, initial=0))
+    eligible = (
+        np.isfinite(hi)
+        & (lo >= 0)
+        & ((hi + 1) ** 2 <= len(P))
+        & (P == np.round(P)).all(axis=0)
+        & (Q == np.round(Q)).all(axis=0)
+        & P.any(axis=0)
+        & Q.any(axis=0)
+    )
+
+    out = np.empty(P.shape[1])
+    for j in np.flatnonzero(eligible):
+        a, b = P[:, j].astype(np.int64), Q[:, j].astype(np.int64)
+        k = int(hi[j]) + 1
+
+        counts = np.bincount(a * k + b, minlength=k * k).reshape(k, k)
+        codes = np.arange(k, dtype=np.float64)
+        p = codes[:, None] / a.sum()
+        q = codes[None, :] / b.sum()
+        m = 0.5 * (p + q)
+
+        js = np.sum(counts * (rel_entr(p, m) + rel_entr(q, m)))
+        out[j] = np.sqrt(0.5 * js)
+
+    fallback = np.flatnonzero(~eligible)
+    if len(fallback):
+        out[fallback] = _jensen_shannon(P[:, fallback], Q[:, fallback])
+
+    return out
+
+
+def _wasserstein(U: np.ndarray, V: np.ndarray) -> np.ndarray:
+    # Column wise scipy.stats.wasserstein_distance, the area between both
+    # empirical CDFs is accumulated over the merged sorted samples. Ties add
+    # zero width, so the cumulative counts act as searchsorted(side="right").
+    # Already sorted columns make the stable argsort a linear merge of runs
+    n, m = len(U), len(V)
+    out = np.empty(U.shape[1])
+    # Merged values, their order, the CDF gaps and widths per column
+    step = _block_columns(n + m, 4 * U.dtype.itemsize + 9)
+
+    # Values seen so far from V are the position minus the ones from U
+    seen = (np.arange(1, n + m, dtype=np.float64)[:, None] / m).astype(U.dtype)
+
+    for start in range(0, U.shape[1], step):
+        cols = slice(start, start + step)
+        W = np.concatenate([U[:, cols], V[:, cols]])
+        order = np.argsort(W, axis=0, kind="stable")
+        W = np.take_along_axis(W, order, axis=0)
+
+        cdf_diff = np.cumsum(order[:-1] < n, axis=0, dtype=U.dtype)
+        cdf_diff *= 1 / n + 1 / m
+        cdf_diff -= seen
+        np.abs(cdf_diff, out=cdf_diff)
+
+        out[cols] = np.einsum(
+            "ij,ij->j", cdf_diff, np.diff(W, axis=0), dtype=np.float64
+        )
+
+    return out
+
+
+def _equal_wasserstein(U: np.ndarray, V: np.ndarray) -> np.ndarray:
+    # Equally sized samples with sorted columns, the optimal transport plan
+    # pairs values by rank so no merge of both samples is needed
+    return np.mean(np.abs(U - V), axis=0, dtype=np.float64)
+
+
+def _fast_read(path: str) -> Optional[pd.DataFrame]:
+    # Arrow formats keep the column types, files written before use CSV
+    if Path(path + ".parquet").is_file():
+        return pd.read_parquet(path + ".parquet")
+    elif Path(path + ".feather").is_file():
+        return pd.read_feather(path + ".feather")
+    elif Path(path + ".csv").is_file():
+        return pd.read_csv(path + ".csv")
+
+    return None
+
+
+def _fast_write(
+    df: pd.DataFrame, path: str, format: str = "parquet", compression="zstd"
+) -> None:
+    extension = ".feather" if format == "feather" else ".parquet"
+    try:
+        if format == "feather":
+            pd.DataFrame(df).reset_index(drop=True).to_feather(
+                path + extension, compression=compression
+            )
+        else:
+            df.to_parquet(
+                path + extension,
+                engine="pyarrow",
+                compression=compression,
+                index=False,
+            )
+    except (ImportError, TypeError, ValueError, NotImplementedError):
+        # Arrow can not store columns mixing types, e.g. numbers and "Missing"
+        extension = ".csv"
+        df.to_csv(path + extension, index=False)
+
+    # _fast_read prefers the Arrow formats, files left by an earlier save
+    # would shadow the one just written
+    for stale in (".parquet", ".feather", ".csv"):
+        if stale != extension:
+            Path(path + stale).unlink(missing_ok=True)
+
+
+def _stratified_split(y, sizes, seed) -> List[np.ndarray]:
+    # Row positions of every split, the rows of each class are shuffled
+    # once and sliced according to the cumulative sizes
+    labels = y.iloc[:, 0] if isinstance(y, pd.DataFrame) else y
+    codes, _ = pd.factorize(np.asarray(labels), use_na_sentinel=False)
+
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(codes))
+    order = order[np.argsort(codes[order], kind="stable")]
+    bounds = np.cumsum(sizes)[:-1]
+
+    splits = [[] for _ in sizes]
+    start = 0
+    for count in np.bincount(codes):
+        rows = order[start : start + count]
+        for split, part in zip(splits, np.split(rows, (bounds * count).astype(int))):
+            split.append(part)
+        start += count
+
+    return [rng.permutation(np.concatenate(split)) for split in splits]
+
 
 class Dataset:
     def __init__(
@@ -26,16 +424,17 @@ class Dataset:
         cache_path="datasets",
         labels=None,
         bins=None,
-        n_partitions=5,
         oversample=0,
     ) -> None:
         self.config = config
         self.cache_path = cache_path
         self.labels = labels
         self.bins = bins
-        self.n_partitions = n_partitions
         self.X_gen = None
         self.y_gen = None
+        # Derived data, see _cached()
+        self._data_version = 0
+        self._cache = {}
 
         with ProgressBar(indeterminate=True).progress as p:
             gen_task = p.add_task(
@@ -64,9 +463,34 @@ class Dataset:
     def __str__(self) -> str:
         return self.config["name"]
 
+    def __getstate__(self) -> dict:
+        # Cached results are not worth copying or pickling
+        state = self.__dict__.copy()
+        state["_cache"] = {}
+
+        return state
+
+    def invalidate_cache(self) -> None:
+        self._data_version += 1
+        self._cache.clear()
+
+    def _cached(self, key, compute, gen=True):
+        # Results are tied to the data version and to the frames they were
+        # computed from, gen=False entries only depend on the real data
+        frames = (self.X, self.y, self.X_gen, self.y_gen) if gen else (self.X, self.y)
+        token = (self._data_version,) + tuple(id(f) for f in frames)
+
+        entry = self._cache.get(key)
+        if entry is None or entry[0] != token:
+            entry = (token, frames, compute())
+            self._cache[key] = entry
+
+        return entry[2]
+
     def oversample(self, multiplier: int) -> None:
         self.X = pd.concat([self.X] * multiplier, ignore_index=True)
         self.y = pd.concat([self.y] * multiplier, ignore_index=True)
+        self.invalidate_cache()
 
     def reset_indexes(self) -> None:
         # Reset indexes
@@ -77,19 +501,44 @@ class Dataset:
         self.y_val.reset_index(drop=True, inplace=True)
         self.y_test.reset_index(drop=True, inplace=True)
 
+    def split(self, features: pd.DataFrame, targets: pd.DataFrame) -> None:
+        # Train, validation and test splits stratified by label
+        held_out = 1 - self.config["train_size"]
+        val_size = (
+            held_out
+            * self.config["val_size"]
+            / (self.config["test_size"] + self.config["val_size"])
+        )
+
+        train, val, test = _stratified_split(
+            targets, (self.config["train_size"], val_size, held_out - val_size), SEED
+        )
+        self.X, self.X_val, self.X_test = (
+            features.iloc[train],
+            features.iloc[val],
+            features.iloc[test],
+        )
+        self.y, self.y_val, self.y_test = (
+            targets.iloc[train],
+            targets.iloc[val],
+            targets.iloc[test],
+        )
+
+        self.reset_indexes()
+
     def load_path(self) -> None:
         self.X = pd.read_csv(self.config["path_X"])
         self.y = pd.read_csv(self.config["path_y"])
         self.X_test = pd.read_csv(self.config["path_X_test"])
         self.y_test = pd.read_csv(self.config["path_y_test"])
 
-        self.X, self.X_val, self.y, self.y_val = train_test_split(
-            self.X,
-            self.y,
-            test_size=self.config["val_size"],
-            random_state=SEED,
-            stratify=self.y,
+        train, val = _stratified_split(
+            self.y, (1 - self.config["val_size"], self.config["val_size"]), SEED
         )
+        self.X, self.X_val = self.X.iloc[train], self.X.iloc[val]
+        self.y, self.y_val = self.y.iloc[train], self.y.iloc[val]
+
+        self.reset_indexes()
 
     def download_imb(self) -> None:
         Path(self.cache_path).mkdir(parents=True, exist_ok=True)
@@ -106,23 +555,7 @@ class Dataset:
         )
         labels = pd.DataFrame({self.config["y_label"]: data.target})
 
-        self.X, self.X_test, self.y, self.y_test = train_test_split(
-            features,
-            labels,
-            test_size=1 - self.config["train_size"],
-            random_state=SEED,
-            stratify=labels,
-        )
-        self.X_val, self.X_test, self.y_val, self.y_test = train_test_split(
-            self.X_test,
-            self.y_test,
-            test_size=self.config["test_size"]
-            / (self.config["test_size"] + self.config["val_size"]),
-            random_state=SEED,
-            stratify=self.y_test,
-        )
-
-        self.reset_indexes()
+        self.split(features, labels)
 
         self.config["binary_columns"] = self.X.columns.values.tolist()
         self.config["categorical_columns"] = []
@@ -148,38 +581,25 @@ class Dataset:
                 bins=self.bins,
             ).astype(str)
 
-        self.X, self.X_test, self.y, self.y_test = train_test_split(
+        self.split(
             sk.frame.loc[:, sk.frame.columns != self.config["y_label"]],
             sk.frame.loc[:, [self.config["y_label"]]],
-            test_size=1 - self.config["train_size"],
-            random_state=SEED,
-            stratify=sk.frame.loc[:, [self.config["y_label"]]],
-        )
-        self.X_val, self.X_test, self.y_val, self.y_test = train_test_split(
-            self.X_test,
-            self.y_test,
-            test_size=self.config["test_size"]
-            / (self.config["test_size"] + self.config["val_size"]),
-            random_state=SEED,
-            stratify=self.y_test,
         )
 
-        self.reset_indexes()
-
     def download_uci(self) -> None:
         Path(os.path.join(self.cache_path, "uci")).mkdir(parents=True, exist_ok=True)
 
         path_features = os.path.join(
-            self.cache_path, "uci", self.config["name"] + "_features.csv"
+            self.cache_path, "uci", self.config["name"] + "_features"
         )
         path_targets = os.path.join(
-            self.cache_path, "uci", self.config["name"] + "_targets.csv"
+            self.cache_path, "uci", self.config["name"] + "_targets"
         )
 
-        if Path(path_features).is_file() and Path(path_targets).is_file():
-            features = pd.read_csv(path_features)
-            targets = pd.read_csv(path_targets)
-        else:
+        features = _fast_read(path_features)
+        targets = _fast_read(path_targets)
+
+        if features is None or targets is None:
             uci = fetch_ucirepo(name=self.config["name"])
 
             # metadata
@@ -187,8 +607,8 @@ class Dataset:
 
             uci.data.features.fillna("Missing", inplace=True)
 
-            uci.data.features.to_csv(path_features, index=False)
-            uci.data.targets.to_csv(path_targets, index=False)
+            _fast_write(uci.data.features, path_features)
+            _fast_write(uci.data.targets, path_targets)
 
             features = uci.data.features
             targets = uci.data.targets
@@ -200,25 +620,9 @@ class Dataset:
                 bins=self.bins,
             ).astype(str)
 
-        self.X, self.X_test, self.y, self.y_test = train_test_split(
-            features,
-            targets,
-            test_size=1 - self.config["train_size"],
-            random_state=SEED,
-            stratify=targets,
-        )
-        self.X_val, self.X_test, self.y_val, self.y_test = train_test_split(
-            self.X_test,
-            self.y_test,
-            test_size=self.config["test_size"]
-            / (self.config["test_size"] + self.config["val_size"]),
-            random_state=SEED,
-            stratify=self.y_test,
-        )
+        self.split(features, targets)
 
-        self.reset_indexes()
-
-    def save_to_disk(self, generator, tuner="") -> None:
+    def save_to_disk(self, generator, tuner="", compression=None) -> None:
         with ProgressBar(indeterminate=True).progress as p:
             gen_task = p.add_task(
                 "Saving dataset to {}...".format(self.config["save_path"]), total=None
@@ -231,13 +635,22 @@ class Dataset:
 
             Path(path).mkdir(parents=True, exist_ok=True)
 
-            self.X_gen.to_csv(
-                os.path.join(path, "X_gen_" + str(generator) + ".csv"),
-                index=False,
+            # Categorical columns are dictionary encoded by feather
+            X_gen = self.X_gen.astype(
+                {col: "category" for col in self.cats if col in self.X_gen.columns}
             )
-            self.y_gen.to_csv(
-                os.path.join(path, "y_gen_" + str(generator) + ".csv"),
-                index=False,
+
+            _fast_write(
+                X_gen,
+                os.path.join(path, "X_gen_" + str(generator)),
+                format="feather",
+                compression=compression,
+            )
+            _fast_write(
+                self.y_gen,
+                os.path.join(path, "y_gen_" + str(generator)),
+                format="feather",
+                compression=compression,
             )
 
         console.print("✅ Dataset saved to {}...".format(path))
@@ -251,49 +664,46 @@ class Dataset:
             else:
                 path = self.config["save_path"] + "_" + str(tuner).lower()
 
-            self.X_gen = pd.read_csv(
-                os.path.join(path, "X_gen_" + str(generator) + ".csv")
-            )
-            self.y_gen = pd.read_csv(
-                os.path.join(path, "y_gen_" + str(generator) + ".csv")
-            )
+            self.X_gen = _fast_read(os.path.join(path, "X_gen_" + str(generator)))
+            self.y_gen = _fast_read(os.path.join(path, "y_gen_" + str(generator)))
+            self.invalidate_cache()
+
+            if self.X_gen is None or self.y_gen is None:
+                raise FileNotFoundError(
+                    "No {} dataset saved in {}".format(generator, path)
+                )
 
         console.print(
             "✅ {} dataset loaded from {}...".format(
-                generator, os.path.join(path, "*_" + str(generator) + ".csv")
+                generator, os.path.join(path, "*_" + str(generator) + ".*")
             )
         )
 
     def compute_categories(self) -> None:
         self.cats = self.config["categorical_columns"] + self.config["binary_columns"]
-        self.X_cats = self.X[self.cats].copy()
-        self.X_cats[self.cats] = self.X_cats[self.cats].apply(
-            lambda col: pd.Categorical(col)
-        )
+        self.X_cats = self.X[self.cats].astype("category")
+        # Category values used to decode, looked up once
+        self._cat_levels = {
+            col: self.X_cats[col].cat.categories for col in self.X_cats.columns
+        }
+        self.invalidate_cache()
 
     def get_min_max(self) -> None:
-        self.mn = np.min(
-            [
-                self.encode_categories(self.X).min(),
-                self.encode_categories(self.X_val).min(),
-                self.encode_categories(self.X_test).min(),
-            ],
-            axis=0,
-        )
-        self.mx = np.max(
-            [
-                self.encode_categories(self.X).max(),
-                self.encode_categories(self.X_val).max(),
-                self.encode_categories(self.X_test).max(),
-            ],
-            axis=0,
-        )
+        encoded = [
+            self.encode_categories(df).to_numpy(dtype=np.float32)
+            for df in (self.X, self.X_val, self.X_test)
+        ]
+
+        # Column order the bounds refer to, used to align inputs on normalize
+        self._min_max_columns = self.X.columns
+        self.mn = np.minimum.reduce([arr.min(axis=0) for arr in encoded])
+        self.mx = np.maximum.reduce([arr.max(axis=0) for arr in encoded])
 
     def get_normalized_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        X_norm = df.copy()
+        X_norm = df[self._min_max_columns].to_numpy(dtype=np.float32)
         X_norm = (X_norm - self.mn) / (self.mx - self.mn)
 
-        return X_norm
+        return pd.DataFrame(X_norm, index=df.index, columns=self._min_max_columns)
 
     # Returns categorical + binary, check compute_categories()
     def get_categories(self) -> list[str]:
@@ -303,9 +713,16 @@ class Dataset:
         return self.config["binary_columns"]
 
     def get_continuous(self) -> list[str]:
-        return self.X.columns.difference(
-            self.cats + [self.config["y_label"]]
-        ).values.tolist()
+        continuous = self._cached(
+            "continuous",
+            lambda: self.X.columns.difference(
+                self.cats + [self.config["y_label"]]
+            ).values.tolist(),
+            gen=False,
+        )
+
+        # Callers are free to modify the list they get
+        return list(continuous)
 
     def encode_categories(self, df: pd.DataFrame) -> pd.DataFrame:
         if self.config.exists("download") and self.config["download"] == "imbalanced":
@@ -313,9 +730,24 @@ class Dataset:
             return df
         else:
             X_enc = df.copy()
-            X_enc[self.cats] = X_enc[self.cats].apply(
-                lambda col: pd.Categorical(col).codes
-            )
+            codes = np.empty((len(df), len(self.cats)), dtype=np.int32)
+
+            # Codes are looked up in the categories of the training data, so
+            # every frame shares them and they round trip through decode
+            for k, col in enumerate(self.cats):
+                values, levels = df[col], self._cat_levels[col]
+                if isinstance(values.dtype, pd.CategoricalDtype) and (
+                    values.cat.categories.equals(levels)
+                ):
+                    codes[:, k] = values.cat.codes
+                else:
+                    codes[:, k] = levels.get_indexer(values)
+
+                # Missing values and levels unseen in training share one extra
+                # code after the known ones, the metrics need non negative codes
+                codes[codes[:, k] < 0, k] = len(levels)
+
+            X_enc[self.cats] = codes
 
         return X_enc
 
@@ -323,12 +755,11 @@ class Dataset:
         if self.config.exists("download") and self.config["download"] == "imbalanced":
             return df
         else:
-            cat_columns = self.X_cats.select_dtypes(["category"]).columns
-            df[cat_columns] = df[cat_columns].apply(
-                lambda col: pd.Categorical.from_codes(
-                    col, self.X_cats[col.name].cat.categories
-                )
-            )
+            for col, categories in self._cat_levels.items():
+                # The extra code of unseen and missing values decodes as missing
+                codes = df[col].to_numpy()
+                codes = np.where(codes == len(categories), -1, codes)
+                df[col] = pd.Categorical.from_codes(codes, categories)
 
         return df
 
@@ -339,15 +770,35 @@ class Dataset:
             self.y_test[self.y_test[self.config["y_label"]].isin(labs)] = cls
 
         self.get_label_encoders()
+        self.invalidate_cache()
 
     def get_label_encoders(self) -> None:
+        # Both encoders are built from a single scan for the sorted labels
+        self._label_classes = np.unique(self.y[self.config["y_label"]].to_numpy())
+
         self.label_encoder = LabelEncoder()
-        self.label_encoder.fit(self.y)
-        self.label_encoder_ohe = OneHotEncoder(sparse_output=False)
-        self.label_encoder_ohe.fit(self.y)
+        self.label_encoder.classes_ = self._label_classes
+        self.label_encoder_ohe = OneHotEncoder(
+            categories=[self._label_classes], sparse_output=False
+        )
+        self.label_encoder_ohe.fit(
+            pd.DataFrame({self.config["y_label"]: self._label_classes})
+        )
 
     def encode_labels(self, df: pd.DataFrame) -> pd.DataFrame:
-        return self.label_encoder.transform(df)
+        values = np.asarray(df).ravel()
+        codes = np.searchsorted(self._label_classes, values)
+
+        # Same as LabelEncoder.transform() without its input validation
+        found = self._label_classes[np.minimum(codes, len(self._label_classes) - 1)]
+        if np.any(found != values):
+            raise ValueError(
+                "y contains previously unseen labels: {}".format(
+                    np.unique(values[found != values]).tolist()
+                )
+            )
+
+        return codes
 
     def decode_labels(self, df: pd.DataFrame) -> pd.DataFrame:
         return self.label_encoder.inverse_transform(df)
@@ -385,26 +836,38 @@ class Dataset:
     def set_split_result(self, data) -> None:
         self.X_gen = data.loc[:, data.columns != self.config["y_label"]]
         self.y_gen = data[[self.config["y_label"]]]
+        self.invalidate_cache()
+
+    def _class_indices(self, cls: str, gen: bool = False) -> np.ndarray:
+        # Row positions of every class, computed once per data version
+        if gen:
+            groups = self._cached(
+                "y_gen_groups",
+                lambda: self.y_gen.groupby(self.config["y_label"]).indices,
+            )
+        else:
+            groups = self._cached(
+                "y_groups",
+                lambda: self.y.groupby(self.config["y_label"]).indices,
+                gen=False,
+            )
+        return groups.get(cls, np.empty(0, dtype=np.intp))
 
     def get_random_class_rows(self, cls: str, n: int):
-        compliant_rows = self.y[self.y[self.config["y_label"]] == cls]
-        idx = compliant_rows.sample(n=n, random_state=SEED).index
-        return self.X.loc[idx]
+        rng = np.random.default_rng(SEED)
+        idx = rng.choice(self._class_indices(cls), size=n, replace=False)
+        return self.X.iloc[idx]
 
     def get_random_gen_class_rows(self, cls: str, n: int):
-        compliant_rows = self.y_gen[self.y_gen[self.config["y_label"]] == cls]
-        idx = compliant_rows.sample(n=n, random_state=SEED).index
-        return self.X_gen.loc[idx]
+        rng = np.random.default_rng(SEED)
+        idx = rng.choice(self._class_indices(cls, gen=True), size=n, replace=False)
+        return self.X_gen.iloc[idx]
 
     def get_class_rows(self, cls: str):
-        compliant_rows = self.y[self.y[self.config["y_label"]] == cls]
-        idx = compliant_rows.index
-        return self.X.loc[idx]
+        return self.X.iloc[self._class_indices(cls)]
 
     def get_gen_class_rows(self, cls: str):
-        compliant_rows = self.y_gen[self.y_gen[self.config["y_label"]] == cls]
-        idx = compliant_rows.index
-        return self.X_gen.loc[idx]
+        return self.X_gen.iloc[self._class_indices(cls, gen=True)]
 
     def get_train_samples(self):
         return len(self.X) + len(self.X_val)
@@ -433,10 +896,17 @@ class Dataset:
         }
 
     def reduce_size(self, class_percentages) -> None:
-        for cls, percent in class_percentages.items():
-            self.reduce_uniformly_randomly(
-                self.y[self.config["y_label"]] == cls, percent
-            )
+        rng = np.random.default_rng(SEED)
+        groups = self.y.groupby(self.config["y_label"]).indices
+
+        # Sample the rows of every class and remove them all at once
+        rows_to_remove = [np.empty(0, dtype=np.intp)] + [
+            rng.choice(groups[cls], size=int(len(groups[cls]) * percent), replace=False)
+            for cls, percent in class_percentages.items()
+            if cls in groups
+        ]
+
+        self.remove(self.y.index[np.concatenate(rows_to_remove)])
 
     def create_bins(self, bins, labels) -> None:
         self.y[self.config["y_label"]] = pd.cut(
@@ -452,6 +922,7 @@ class Dataset:
         ).astype(str)
 
         self.get_label_encoders()
+        self.invalidate_cache()
 
     def remove(self, rows_to_remove) -> None:
         # Remove the selected rows from the DataFrame
@@ -459,6 +930,7 @@ class Dataset:
         self.X.reset_index(drop=True, inplace=True)
         self.y.drop(rows_to_remove, inplace=True)
         self.y.reset_index(drop=True, inplace=True)
+        self.invalidate_cache()
 
     def drop_first_n(self, n) -> None:
         # Get first rows index
@@ -491,44 +963,27 @@ class Dataset:
 
     def reduce_mem_df(self, df) -> None:
         for col in df.columns:
-            col_type = self.X[col].dtype
-
-            if col_type != object and col_type != "category":
-                c_min = self.X[col].min()
-                c_max = self.X[col].max()
-                if str(col_type)[:3] == "int":
-                    if c_min > np.iinfo(np.int8).min and c_max < np.iinfo(np.int8).max:
-                        self.X[col] = self.X[col].astype(np.int8)
-                    elif (
-                        c_min > np.iinfo(np.int16).min
-                        and c_max < np.iinfo(np.int16).max
-                    ):
-                        self.X[col] = self.X[col].astype(np.int16)
-                    elif (
-                        c_min > np.iinfo(np.int32).min
-                        and c_max < np.iinfo(np.int32).max
-                    ):
-                        self.X[col] = self.X[col].astype(np.int32)
-                    elif (
-                        c_min > np.iinfo(np.int64).min
-                        and c_max < np.iinfo(np.int64).max
-                    ):
-                        self.X[col] = self.X[col].astype(np.int64)
+            col_type = df[col].dtype
+
+            if is_integer_dtype(col_type) or is_float_dtype(col_type):
+                c_min, c_max = df[col].agg(["min", "max"])
+
+                # Narrowest type with min < c_min and c_max < max, ranges are
+                # symmetric so only the upper bounds need to be searched
+                if is_integer_dtype(col_type):
+                    bound = min(max(int(c_max), -int(c_min) - 1), _INT_MAXES[-1])
+                    idx = np.searchsorted(_INT_MAXES, bound, side="right")
+                    if idx < len(_INT_TYPES):
+                        df[col] = df[col].astype(_INT_TYPES[idx])
                 else:
-                    if (
-                        c_min > np.finfo(np.float16).min
-                        and c_max < np.finfo(np.float16).max
-                    ):
-                        self.X[col] = self.X[col].astype(np.float16)
-                    elif (
-                        c_min > np.finfo(np.float32).min
-                        and c_max < np.finfo(np.float32).max
-                    ):
-                        self.X[col] = self.X[col].astype(np.float32)
-                    else:
-                        self.X[col] = self.X[col].astype(np.float64)
-            else:
-                self.X[col] = self.X[col].astype("category")
+                    idx = np.searchsorted(
+                        _FLOAT_MAXES, max(c_max, -c_min), side="right"
+                    )
+                    df[col] = df[col].astype(_FLOAT_TYPES[idx])
+            elif not is_bool_dtype(col_type):
+                df[col] = df[col].astype("category")
+
+        self.invalidate_cache()
 
     def reduce_mem(self) -> None:
         """iterate through all the columns of a dataframe and modify the data type
@@ -584,74 +1039,132 @@ class Dataset:
             )
         )
 
-    def get_single_encoded_data(self):
-        X_real = self.encode_categories(self.X)
-        X_gen = self.encode_categories(self.X_gen)
+    def encode_single(self, X: pd.DataFrame, y: pd.DataFrame) -> pd.DataFrame:
+        X_enc = self.encode_categories(X)
+        y_enc = pd.Series(self.encode_labels(y), name=self.config["y_label"])
 
-        y_real = pd.Series(self.encode_labels(self.y), name=self.config["y_label"])
-        y_gen = pd.Series(self.encode_labels(self.y_gen), name=self.config["y_label"])
+        # Single precision is enough for every metric and halves the traffic
+        return pd.concat([X_enc, y_enc], axis=1).astype(np.float32, copy=False)
 
-        real_data = pd.concat([X_real, y_real], axis=1)
-        gen_data = pd.concat([X_gen, y_gen], axis=1)
+    def get_single_encoded_data(self):
+        # The real side stays valid while only the generated data changes
+        real_data = self._cached(
+            "real_encoded", lambda: self.encode_single(self.X, self.y), gen=False
+        )
+        gen_data = self._cached(
+            "gen_encoded", lambda: self.encode_single(self.X_gen, self.y_gen)
+        )
 
         return real_data, gen_data
 
+    def get_column_positions(self) -> Tuple[np.ndarray, np.ndarray]:
+        # Positions of the categorical and continuous columns in the encoded
+        # arrays, so they are sliced without building intermediate frames
+        def compute():
+            columns = self.X.columns.append(pd.Index([self.config["y_label"]]))
+            return (
+                columns.get_indexer(self.get_categories()),
+                columns.get_indexer(self.get_continuous()),
+            )
+
+        return self._cached("column_positions", compute, gen=False)
+
+    def get_sorted_continuous(self) -> np.ndarray:
+        # Real continuous columns sorted once, shared by every Wasserstein call
+        def compute():
+            real_array, _ = self.get_encoded_arrays()
+            _, cont_idx = self.get_column_positions()
+            return np.sort(real_array[:, cont_idx], axis=0)
+
+        return self._cached("real_sorted_continuous", compute, gen=False)
+
+    def get_column_major(self, df: pd.DataFrame) -> np.ndarray:
+        # Float32 column-major layout, column reductions and the matrix
+        # products of the metrics walk contiguous memory
+        return np.asfortranarray(df.to_numpy(dtype=np.float32))
+
+    def get_encoded_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        real_data, gen_data = self.get_single_encoded_data()
+
+        real_array = self._cached(
+            "real_array", lambda: self.get_column_major(real_data), gen=False
+        )
+        # Generated columns follow the real order so positions are shared
+        gen_array = self._cached(
+            "gen_array", lambda: self.get_column_major(gen_data[real_data.columns])
+        )
+
+        return real_array, gen_array
+
+    def get_real_tree(self) -> cKDTree:
+        # Built once on the real rows and reused for every generated set
+        real_array, _ = self.get_encoded_arrays()
+        return self._cached("real_tree", lambda: cKDTree(real_array), gen=False)
+
     def theils_u_mat(self, df):
-        # Compute Theil's U-statistics between each pair of columns
+        # Compute Theil's U-statistics between each pair of columns, with
+        # U(i|j) = (H(i) - H(i|j)) / H(i) and H(i|j) = H(i, j) - H(j)
         cate_columns = df.shape[1]
-        theils_u_mat = np.zeros((cate_columns, cate_columns))
+        theils_u_mat = np.ones((cate_columns, cate_columns))
+
+        codes = [
+            pd.factorize(df.iloc[:, i], use_na_sentinel=False)[0]
+            for i in range(cate_columns)
+        ]
+        sizes = [c.max() + 1 if len(c) else 0 for c in codes]
+        h = [entropy(np.bincount(c)) for c in codes]
 
         for i in range(cate_columns):
-            for j in range(cate_columns):
-                theils_u_mat[i, j] = theils_u(df.iloc[:, i], df.iloc[:, j])
+            for j in range(i + 1, cate_columns):
+                # Joint counts from the contingency table of both columns
+                joint = codes[i] * sizes[j] + codes[j]
+                if sizes[i] * sizes[j] <= len(joint):
+                    h_ij = entropy(np.bincount(joint))
+                else:
+                    h_ij = entropy(np.unique(joint, return_counts=True)[1])
+
+                if h[i] != 0:
+                    theils_u_mat[i, j] = (h[i] - h_ij + h[j]) / h[i]
+                if h[j] != 0:
+                    theils_u_mat[j, i] = (h[j] - h_ij + h[i]) / h[j]
 
         return theils_u_mat
 
     # See the post https://towardsdatascience.com/the-search-for-categorical-correlation-a1cf7f1888c9
     def correlation_ratio(self, categories, measurements):
         fcat, _ = pd.factorize(categories)
-        cat_num = np.max(fcat) + 1
-        y_avg_array = np.zeros(cat_num)
-        n_array = np.zeros(cat_num)
-        for i in range(0, cat_num):
-            cat_measures = measurements[np.argwhere(fcat == i).flatten()]
-            n_array[i] = len(cat_measures)
-            y_avg_array[i] = np.average(cat_measures)
-        y_total_avg = np.sum(np.multiply(y_avg_array, n_array)) / np.sum(n_array)
-        numerator = np.sum(
-            np.multiply(n_array, np.power(np.subtract(y_avg_array, y_total_avg), 2))
-        )
-        denominator = np.sum(np.power(np.subtract(measurements, y_total_avg), 2))
-        if numerator == 0:
-            eta = 0.0
-        else:
-            eta = numerator / denominator
-        return eta
 
-    def ratio_mat(self, df, continuous_columns, categorical_columns):
-        rat_mat = pd.DataFrame(index=continuous_columns, columns=categorical_columns)
+        return _corr_ratio(
+            fcat, np.asarray(measurements, dtype=np.float64), np.max(fcat) + 1
+        )
 
+    def ratio_mat(self, df, continuous_columns, categorical_columns):
         if len(categorical_columns) == 0 or len(continuous_columns) == 0:
             return np.zeros(1)
-        else:
-            for cat_col in categorical_columns:
-                for cont_col in continuous_columns:
-                    rat_mat[cat_col][cont_col] = self.correlation_ratio(
-                        df[cat_col], df[cont_col]
-                    )
-        return rat_mat.values
+
+        rat_mat = np.empty(
+            (len(continuous_columns), len(categorical_columns)), dtype=np.float32
+        )
+        measurements = [
+            df[cont_col].to_numpy(dtype=np.float64) for cont_col in continuous_columns
+        ]
+
+        # Each categorical column is factorized once for all its partners
+        for j, cat_col in enumerate(categorical_columns):
+            fcat, _ = pd.factorize(df[cat_col])
+            k = np.max(fcat) + 1
+            for i, meas in enumerate(measurements):
+                rat_mat[i, j] = _corr_ratio(fcat, meas, k)
+
+        return rat_mat
 
     def fillNa_cont(self, df):
-        for col in df.columns:
-            mean_values = df[col].mean()
-            df[col].fillna(mean_values, inplace=True)
-        return df
+        return df.fillna(df.mean(numeric_only=True))
 
     def fillNa_cate(self, df):
-        for col in df.columns:
-            mode_values = df[col].mode()[0]
-            df[col].fillna(mode_values, inplace=True)
-        return df
+        if df.empty:
+            return df
+        return df.fillna(df.mode().iloc[0])
 
     def compute_correlations(self, df):
         num_mat = pd.DataFrame(df[self.get_continuous()])
@@ -660,7 +1173,7 @@ class Dataset:
         num_mat = self.fillNa_cont(num_mat)
         cat_mat = self.fillNa_cate(cat_mat)
 
-        pearson_sub_matrix = np.corrcoef(num_mat, rowvar=False)
+        pearson_sub_matrix = np.corrcoef(self.get_column_major(num_mat), rowvar=False)
         theils_u_matrix = self.theils_u_mat(cat_mat)
         correl_ratio_mat = self.ratio_mat(
             df, self.get_continuous(), self.get_categories()
@@ -675,7 +1188,11 @@ class Dataset:
                 total=None,
             )
             real_data, gen_data = self.get_single_encoded_data()
-            real_pear, real_theils, real_ratio = self.compute_correlations(real_data)
+            real_pear, real_theils, real_ratio = self._cached(
+                "real_correlations",
+                lambda: self.compute_correlations(real_data),
+                gen=False,
+            )
             gen_pear, gen_theils, gen_ratio = self.compute_correlations(gen_data)
 
         console.print(
@@ -696,88 +1213,99 @@ class Dataset:
         ).abs()
 
     def column_entropy(self, column):
-        _, counts = np.unique(np.round(column), return_counts=True)
+        values = np.round(np.asarray(column, dtype=np.float64))
+        lo, hi = (values.min(), values.max()) if len(values) else (0, -1)
+
+        # Counting sort when the rounded values span a compact range
+        if np.isfinite(lo) and np.isfinite(hi) and hi - lo < 2 * len(values):
+            counts = np.bincount((values - lo).astype(np.int64))
+        else:
+            _, counts = np.unique(values, return_counts=True)
 
         return entropy(counts)
 
-    def compute_distances_hits(self, thres_percent=0.3):
+    def compute_distances_hits(self, thres_percent=0.3, n_jobs=1):
         with ProgressBar(indeterminate=True).progress as p:
             p.add_task("Computing distances and hits...", total=None)
 
-            real_data, gen_data = self.get_single_encoded_data()
-
-            # Convert DataFrames to Dask DataFrames
-            real_ddf = dd.from_pandas(real_data, npartitions=self.n_partitions)
-            gen_ddf = dd.from_pandas(gen_data, npartitions=self.n_partitions)
+            synth_dists, real_hits_diffs = self._distances_hits(thres_percent, n_jobs)
 
-            real_array = real_ddf.compute().values
-            fake_array = gen_ddf.compute().values
+        console.print("✅ Distances and hits computation complete...")
 
-            def euclidean_distance(source, target, w=None):
-                if w is None:
-                    return np.sqrt(((source - target) ** 2).sum(axis=1))
-                else:
-                    return np.sqrt(
-                        (((source - target) / w[np.newaxis, :]) ** 2).sum(axis=1)
-                    )
+        return synth_dists, real_hits_diffs
 
-            # Function to compute the minimum L2 distance for each row in syn_df with respect to real_df
-            def min_l2_distance(row, real_array):
-                distance_array = euclidean_distance(row.values, real_array)
-                first, second = np.partition(distance_array, 1)[0:2]
+    def _distances_hits(self, thres_percent=0.3, n_jobs=1):
+        real_data, gen_data = self.get_single_encoded_data()
+        real_array, fake_array = self.get_encoded_arrays()
+        _, cont_idx = self.get_column_positions()
+
+        # Obtain range in columns to check for repeated samples within threshold,
+        # categorical and label columns have to match exactly
+        thres = np.zeros(real_array.shape[1], dtype=np.float32)
+        thres[cont_idx] = thres_percent * (
+            np.nanmax(real_array[:, cont_idx], axis=0)
+            - np.nanmin(real_array[:, cont_idx], axis=0)
+        )
 
-                return [first, second] if first < second else [second, first]
+        # Entropy weights for Epsilon Risk, walking the array columns directly
+        w = self._cached(
+            "entropy_weights",
+            lambda: np.array(
+                [self.column_entropy(col) for col in real_array.T], dtype=np.float32
+            ),
+            gen=False,
+        )
 
-            # Calculate the minimum L2 distance for each row in gen_df with respect to real_df
-            gen_ddf[["s_r_l2_min_1", "s_r_l2_min_2"]] = gen_ddf.apply(
-                min_l2_distance,
-                axis=1,
-                args=(real_array,),
-                result_type="expand",
-                meta={0: "f8", 1: "f8"},
+        # Minimum L2 distances for each row in gen_data with respect to
+        # real_data, hits for Hitting Rate and distances for Epsilon Risk.
+        # The closest real record is the row itself so the second is kept
+        if torch.cuda.is_available():
+            real_t, fake_t, thres_t, w_t = (
+                torch.from_numpy(a).to(DEVICE)
+                for a in (real_array, fake_array, thres, w)
             )
 
-            # Convert the Dask DataFrame to a Pandas DataFrame
-            synth_dists = gen_ddf.compute()[["s_r_l2_min_1", "s_r_l2_min_2"]]
+            # Both sweeps are queued on their own stream so they overlap
+            main = torch.cuda.current_stream()
+            streams = [torch.cuda.Stream() for _ in range(2)]
+            for stream in streams:
+                stream.wait_stream(main)
 
-            # Obtain range in columns to check for repeated samples within threshold
-            thres = thres_percent * (real_data.max() - real_data.min())
-            thres[self.get_categories() + [self.config["y_label"]]] = 0
+            with torch.cuda.stream(streams[0]):
+                s_r_min = _sweep_gen_to_real(fake_t, real_t)
+            with torch.cuda.stream(streams[1]):
+                real_stats = _sweep_real_to_all(real_t, fake_t, thres_t, w_t)
 
-            # Entropy weights for Epsilon Risk
-            w = np.array([self.column_entropy(data) for _, data in real_data.items()])
-
-            # Compute hits for Hitting Rate and distances for Epsilon Risk
-            def min_dist_real_synth(row, real_array, fake_array, thres, w):
-                fake_distance = row.values - fake_array
-                hits = (np.abs(fake_distance) <= thres).all(axis=1)
-                fake_distance = np.sqrt(
-                    ((fake_distance / w[np.newaxis, :]) ** 2).sum(axis=1)
-                )
-                real_distance = euclidean_distance(row.values, real_array, w)
-                first, second = np.partition(real_distance, 1)[0:2]
-                min_real_dist = second if first < second else first
-
-                return [hits.any(), fake_distance.min(), min_real_dist]
-
-            real_ddf[["hit", "r_s_diff_min", "r_r_diff_min"]] = real_ddf.apply(
-                min_dist_real_synth,
-                axis=1,
-                args=(
-                    real_array,
-                    fake_array,
-                    thres.values,
-                    w,
-                ),
-                result_type="expand",
-                meta={0: "?", 1: "f8", 2: "f8"},
+            torch.cuda.synchronize()
+            s_r_min = s_r_min.cpu().numpy()
+            hits, r_s_min, r_r_min = (t.cpu().numpy() for t in real_stats)
+        else:
+            # Both sweeps run on their own thread, the requested threads are
+            # split among them
+            n_jobs = max(1, n_jobs // 2)
+            tree = (
+                self.get_real_tree() if real_array.shape[1] <= KDTREE_MAX_DIMS else None
             )
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                gen_future = executor.submit(
+                    _sweep_gen_to_real, fake_array, real_array, n_jobs, tree
+                )
+                real_future = executor.submit(
+                    _sweep_real_to_all, real_array, fake_array, thres, w, n_jobs
+                )
 
-            real_hits_diffs = real_ddf.compute()[
-                ["hit", "r_s_diff_min", "r_r_diff_min"]
-            ]
+                s_r_min = gen_future.result()
+                hits, r_s_min, r_r_min = real_future.result()
 
-        console.print("✅ Distances and hits computation complete...")
+        synth_dists = pd.DataFrame(
+            s_r_min,
+            index=gen_data.index,
+            columns=["s_r_l2_min_1", "s_r_l2_min_2"],
+        )
+        real_hits_diffs = pd.DataFrame(
+            {"hit": hits, "r_s_diff_min": r_s_min, "r_r_diff_min": r_r_min},
+            index=real_data.index,
+        )
 
         return synth_dists, real_hits_diffs
 
@@ -824,32 +1352,95 @@ class Dataset:
 
         return nn_dist_ratio
 
-    def jensen_shannon_distance(self):
+    def jensen_shannon_distance(self, n_jobs=1, dtype=np.float32):
         with ProgressBar(indeterminate=True).progress as p:
             p.add_task("Computing Jensen Shannon Distance...", total=None)
 
-            real_data, gen_data = self.get_single_encoded_data()
-            real_data = real_data[self.get_categories()]
-            gen_data = gen_data[self.get_categories()]
-
-            distances = real_data.apply(lambda x: jensenshannon(x, gen_data[x.name]))
+            distances = self._jensen_shannon_distances(n_jobs, dtype)
 
         console.print("✅ Jensen Shannon computation complete...")
 
         return distances
 
-    def wasserstein_distance(self):
+    def _jensen_shannon_distances(self, n_jobs=1, dtype=np.float32):
+        real_array, gen_array = self.get_encoded_arrays()
+        cat_idx, _ = self.get_column_positions()
+        real_cat, gen_cat = real_array[:, cat_idx], gen_array[:, cat_idx]
+
+        # Only the categorical codes are narrowed, and only for this call.
+        # Integers are exact up to 2**(mantissa bits + 1), 2048 for float16
+        dtype = np.dtype(dtype)
+        if dtype != real_cat.dtype:
+            limit = 2 ** (np.finfo(dtype).nmant + 1)
+            largest = max(np.abs(a).max(initial=0) for a in (real_cat, gen_cat))
+            if largest > limit:
+                raise ValueError(
+                    f"Categorical codes above {limit} are not exact in {dtype}"
+                )
+            real_cat, gen_cat = real_cat.astype(dtype), gen_cat.astype(dtype)
+
+        distances = pd.Series(
+            _parallel_columns(
+                _jensen_shannon_codes,
+                real_cat,
+                gen_cat,
+                n_jobs=n_jobs,
+            ),
+            index=self.get_categories(),
+        )
+
+        return distances
+
+    def wasserstein_distance(self, n_jobs=1):
         with ProgressBar(indeterminate=True).progress as p:
             p.add_task("Computing Wasserstein Distance...", total=None)
 
-            real_data, gen_data = self.get_single_encoded_data()
-            real_data = real_data[self.get_continuous()]
-            gen_data = gen_data[self.get_continuous()]
-
-            distances = real_data.apply(
-                lambda x: wasserstein_distance(x, gen_data[x.name])
-            )
+            distances = self._wasserstein_distances(n_jobs)
 
         console.print("✅ Wasserstein computation complete...")
 
         return distances
+
+    def _wasserstein_distances(self, n_jobs=1):
+        real_array, gen_array = self.get_encoded_arrays()
+        _, cont_idx = self.get_column_positions()
+
+        # Only the generated side is sorted on every evaluation
+        kernel = (
+            _equal_wasserstein if len(real_array) == len(gen_array) else _wasserstein
+        )
+        distances = pd.Series(
+            _parallel_columns(
+                kernel,
+                self.get_sorted_continuous(),
+                np.sort(gen_array[:, cont_idx], axis=0),
+                n_jobs=n_jobs,
+            ),
+            index=self.get_continuous(),
+        )
+
+        return distances
+
+    def compute_metrics(
+        self, which=("jsd", "wd", "nn"), thres_percent=0.3, n_jobs=1
+    ) -> dict:
+        metrics = {
+            "jsd": self._jensen_shannon_distances,
+            "wd": self._wasserstein_distances,
+            "nn": lambda n_jobs: self._distances_hits(thres_percent, n_jobs),
+        }
+
+        unknown = set(which) - set(metrics)
+        if unknown:
+            raise ValueError(f"Unknown metrics: {sorted(unknown)}")
+
+        with ProgressBar(indeterminate=True).progress as p:
+            p.add_task("Computing metrics...", total=None)
+
+            # Data is encoded once, every metric reads the shared arrays
+            self.get_encoded_arrays()
+            results = {name: metrics[name](n_jobs) for name in which}
+
+        console.print("✅ Metrics computation complete...")
+
+        return results
@@ -1,3 +1,4 @@
+import os
 from time import perf_counter
 
 from rich.console import Console
@@ -36,6 +37,11 @@ PROG_COLUMNS = [
 console = Console(record=True)
 
 
+def progress_disabled() -> bool:
+    # Redirected output or an explicit opt out skip the refresh thread
+    return not console.is_terminal or bool(os.environ.get("TABLY_NO_PROGRESS"))
+
+
 class ProgressBar:
     def __init__(self, indeterminate: bool = False) -> None:
         # Define custom progress bar
@@ -45,6 +51,7 @@ class ProgressBar:
                 transient=TRANSIENT,
                 console=console,
                 expand=EXPAND,
+                disable=progress_disabled(),
             )
         else:
             self.progress = Progress(
@@ -52,6 +59,7 @@ class ProgressBar:
                 transient=TRANSIENT,
                 console=console,
                 expand=EXPAND,
+                disable=progress_disabled(),
             )
 
 
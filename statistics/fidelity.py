@@ -150,13 +150,13 @@ for c in configs:
             theils.loc[c[2], g[1]] = norm_theils
             ratio.loc[c[2], g[1]] = norm_ratio
 
+            metrics = dataset.compute_metrics(which=("jsd", "wd"))
+
             if len(dataset.get_categories()):
-                js_dists = dataset.jensen_shannon_distance()
-                jensen_shannon.loc[c[2], g[1]] = js_dists.mean()
+                jensen_shannon.loc[c[2], g[1]] = metrics["jsd"].mean()
 
             if len(dataset.get_continuous()):
-                ws_dists = dataset.wasserstein_distance()
-                wasserstein.loc[c[2], g[1]] = ws_dists.mean()
+                wasserstein.loc[c[2], g[1]] = metrics["wd"].mean()
 
         except FileNotFoundError:
             if len(dataset.get_categories()):
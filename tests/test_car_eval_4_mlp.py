@@ -1,161 +1,126 @@
-from gentab.generators import (
-    SMOTE,
-    ADASYN,
-    TVAE,
-    CTGAN,
-    GaussianCopula,
-    CopulaGAN,
-    CTABGAN,
-    CTABGANPlus,
-    AutoDiffusion,
-    ForestDiffusion,
-    Tabula,
-    GReaT,
-)
-from gentab.evaluators import MLP
-from gentab.tuners import (
-    SMOTETuner,
-    ADASYNTuner,
-    TVAETuner,
-    CTGANTuner,
-    GaussianCopulaTuner,
-    CopulaGANTuner,
-    CTABGANTuner,
-    CTABGANPlusTuner,
-    AutoDiffusionTuner,
-    ForestDiffusionTuner,
-    TabulaTuner,
-    GReaTTuner,
-)
-from gentab.data import Config, Dataset
-from gentab.utils import console
-
-config = Config("configs/car_eval_4.json")
-
-dataset = Dataset(config)
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# The workers import gentab (and with it torch) themselves, after the
+# CPU-only worker has hidden the GPU
+config_path = "configs/car_eval_4.json"
 
 trials = 10
+# GPU tuners run one at a time, only the CPU-only ones overlap with them
+gpu_workers = 1
+cpu_workers = 1
+
+
+def hide_gpu():
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+
+def run_tuner(generator, tuner, generator_kwargs=None, tuner_kwargs=None):
+    import gentab.generators
+    import gentab.tuners
+    from gentab.evaluators import MLP
+    from gentab.data import Config, Dataset
+    from gentab.utils import console
+
+    dataset = Dataset(Config(config_path))
+
+    console.print(dataset.class_counts(), dataset.row_count())
+    generator = getattr(gentab.generators, generator)(
+        dataset, **(generator_kwargs or {})
+    )
+    evaluator = MLP(generator)
+    tuner = getattr(gentab.tuners, tuner)(evaluator, trials, **(tuner_kwargs or {}))
+    tuner.tune()
+    tuner.save_to_disk()
+
+    return dataset.generated_class_counts(), dataset.generated_row_count()
+
+
+gpu_jobs = [
+    dict(generator="TVAE", tuner="TVAETuner"),
+    dict(generator="CTGAN", tuner="CTGANTuner"),
+    dict(generator="GaussianCopula", tuner="GaussianCopulaTuner"),
+    dict(generator="CopulaGAN", tuner="CopulaGANTuner"),
+    dict(
+        generator="CTABGAN",
+        tuner="CTABGANTuner",
+        generator_kwargs=dict(test_ratio=0.10),
+    ),
+    dict(
+        generator="CTABGANPlus",
+        tuner="CTABGANPlusTuner",
+        generator_kwargs=dict(test_ratio=0.10),
+    ),
+    dict(
+        generator="AutoDiffusion",
+        tuner="AutoDiffusionTuner",
+        tuner_kwargs=dict(
+            min_batch=64, max_batch=128, min_epochs=1000, max_epochs=1000
+        ),
+    ),
+    dict(
+        generator="GReaT",
+        tuner="GReaTTuner",
+        generator_kwargs=dict(
+            epochs=15,
+            max_length=1024,
+            temperature=0.6,
+            batch_size=32,
+            max_tries_per_batch=4096,
+            n_samples=8192,
+        ),
+        tuner_kwargs=dict(min_epochs=15, max_epochs=30, max_tries_per_batch=16384),
+    ),
+    dict(
+        generator="Tabula",
+        tuner="TabulaTuner",
+        generator_kwargs=dict(
+            epochs=15,
+            max_length=1024,
+            temperature=0.6,
+            batch_size=32,
+            max_tries_per_batch=4096,
+            n_samples=8192,
+        ),
+        tuner_kwargs=dict(min_epochs=15, max_epochs=30, max_tries_per_batch=16384),
+    ),
+    dict(generator="SMOTE", tuner="SMOTETuner"),
+    dict(
+        generator="ADASYN",
+        tuner="ADASYNTuner",
+        generator_kwargs=dict(sampling_strategy="minority"),
+    ),
+]
+
+cpu_jobs = [
+    dict(
+        generator="ForestDiffusion",
+        tuner="ForestDiffusionTuner",
+        generator_kwargs=dict(n_jobs=1, duplicate_K=4, n_estimators=100),
+    ),
+]
+
+if __name__ == "__main__":
+    from gentab.data import Config, Dataset
+    from gentab.utils import console
+
+    # Downloads the dataset once, the workers then only read the cache
+    Dataset(Config(config_path))
+
+    # Separate pools so a worker that hid the GPU never picks up a GPU job,
+    # spawn keeps CUDA state out of the workers
+    context = multiprocessing.get_context("spawn")
+    cpu_pool = ProcessPoolExecutor(
+        max_workers=cpu_workers, mp_context=context, initializer=hide_gpu
+    )
+    gpu_pool = ProcessPoolExecutor(max_workers=gpu_workers, mp_context=context)
+
+    with cpu_pool, gpu_pool:
+        futures = {gpu_pool.submit(run_tuner, **job): job for job in gpu_jobs}
+        futures.update({cpu_pool.submit(run_tuner, **job): job for job in cpu_jobs})
 
-console.print(dataset.class_counts(), dataset.row_count())
-generator = TVAE(dataset)
-evaluator = MLP(generator)
-tuner = TVAETuner(evaluator, trials)
-tuner.tune()
-tuner.save_to_disk()
-console.print(dataset.generated_class_counts(), dataset.generated_row_count())
-
-console.print(dataset.class_counts(), dataset.row_count())
-generator = CTGAN(dataset)
-evaluator = MLP(generator)
-tuner = CTGANTuner(evaluator, trials)
-tuner.tune()
-tuner.save_to_disk()
-console.print(dataset.generated_class_counts(), dataset.generated_row_count())
-
-console.print(dataset.class_counts(), dataset.row_count())
-generator = GaussianCopula(dataset)
-evaluator = MLP(generator)
-tuner = GaussianCopulaTuner(evaluator, trials)
-tuner.tune()
-tuner.save_to_disk()
-console.print(dataset.generated_class_counts(), dataset.generated_row_count())
-
-console.print(dataset.class_counts(), dataset.row_count())
-generator = CopulaGAN(dataset)
-evaluator = MLP(generator)
-tuner = CopulaGANTuner(evaluator, trials)
-tuner.tune()
-tuner.save_to_disk()
-console.print(dataset.generated_class_counts(), dataset.generated_row_count())
-
-console.print(dataset.class_counts(), dataset.row_count())
-generator = CTABGAN(
-    dataset,
-    test_ratio=0.10,
-)
-evaluator = MLP(generator)
-tuner = CTABGANTuner(evaluator, trials)
-tuner.tune()
-tuner.save_to_disk()
-console.print(dataset.generated_class_counts(), dataset.generated_row_count())
-
-console.print(dataset.class_counts(), dataset.row_count())
-generator = CTABGANPlus(
-    dataset,
-    test_ratio=0.10,
-)
-evaluator = MLP(generator)
-tuner = CTABGANPlusTuner(evaluator, trials)
-tuner.tune()
-tuner.save_to_disk()
-console.print(dataset.generated_class_counts(), dataset.generated_row_count())
-
-console.print(dataset.class_counts(), dataset.row_count())
-generator = AutoDiffusion(dataset)
-evaluator = MLP(generator)
-tuner = AutoDiffusionTuner(
-    evaluator, trials, min_batch=64, max_batch=128, min_epochs=1000, max_epochs=1000
-)
-tuner.tune()
-tuner.save_to_disk()
-console.print(dataset.generated_class_counts(), dataset.generated_row_count())
-
-console.print(dataset.class_counts(), dataset.row_count())
-generator = ForestDiffusion(dataset, n_jobs=1, duplicate_K=4, n_estimators=100)
-evaluator = MLP(generator)
-tuner = ForestDiffusionTuner(evaluator, trials)
-tuner.tune()
-tuner.save_to_disk()
-console.print(dataset.generated_class_counts(), dataset.generated_row_count())
-
-console.print(dataset.class_counts(), dataset.row_count())
-generator = GReaT(
-    dataset,
-    epochs=15,
-    max_length=1024,
-    temperature=0.6,
-    batch_size=32,
-    max_tries_per_batch=4096,
-    n_samples=8192,
-)
-evaluator = MLP(generator)
-tuner = GReaTTuner(
-    evaluator, trials, min_epochs=15, max_epochs=30, max_tries_per_batch=16384
-)
-tuner.tune()
-tuner.save_to_disk()
-console.print(dataset.generated_class_counts(), dataset.generated_row_count())
-
-console.print(dataset.class_counts(), dataset.row_count())
-generator = Tabula(
-    dataset,
-    epochs=15,
-    max_length=1024,
-    temperature=0.6,
-    batch_size=32,
-    max_tries_per_batch=4096,
-    n_samples=8192,
-)
-evaluator = MLP(generator)
-tuner = TabulaTuner(
-    evaluator, trials, min_epochs=15, max_epochs=30, max_tries_per_batch=16384
-)
-tuner.tune()
-tuner.save_to_disk()
-console.print(dataset.generated_class_counts(), dataset.generated_row_count())
-
-console.print(dataset.class_counts(), dataset.row_count())
-generator = SMOTE(dataset)
-evaluator = MLP(generator)
-tuner = SMOTETuner(evaluator, trials)
-tuner.tune()
-tuner.save_to_disk()
-console.print(dataset.generated_class_counts(), dataset.generated_row_count())
-
-console.print(dataset.class_counts(), dataset.row_count())
-generator = ADASYN(dataset, sampling_strategy="minority")
-evaluator = MLP(generator)
-tuner = ADASYNTuner(evaluator, trials)
-tuner.tune()
-tuner.save_to_disk()
-console.print(dataset.generated_class_counts(), dataset.generated_row_count())
+        for future in as_completed(futures):
+            class_counts, row_count = future.result()
+            console.print(futures[future]["generator"])
+            console.print(class_counts, row_count)
@@ -0,0 +1,82 @@
+from gentab.data import Config, Dataset
+from gentab.data.dataset import _jensen_shannon_codes
+
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+def toy_dataset(path):
+    # Small CSV backed dataset with one categorical and one continuous column
+    rng = np.random.default_rng(0)
+    n = 400
+    X = pd.DataFrame(
+        {
+            "color": rng.choice(["red", "green", "blue"], n),
+            "size": rng.normal(10, 2, n),
+        }
+    )
+    y = pd.DataFrame({"label": rng.integers(0, 2, n)})
+
+    files = {}
+    for name, df in (("X", X), ("y", y), ("X_test", X), ("y_test", y)):
+        files["path_" + name] = os.path.join(path, name + ".csv")
+        df.to_csv(files["path_" + name], index=False)
+
+    config_path = os.path.join(path, "config.json")
+    with open(config_path, "w") as jsonfile:
+        json.dump(
+            {
+                "task_type": "binary",
+                "name": "toy",
+                "y_label": "label",
+                "val_size": 0.1,
+                "categorical_columns": ["color"],
+                "binary_columns": [],
+                "integer_columns": [],
+                **files,
+            },
+            jsonfile,
+        )
+
+    return Dataset(Config(config_path), cache_path=path)
+
+
+def test_unseen_generated_level():
+    with tempfile.TemporaryDirectory() as path:
+        dataset = toy_dataset(path)
+        levels = dataset._cat_levels["color"]
+
+        dataset.X_gen = dataset.X.copy()
+        dataset.y_gen = dataset.y.copy()
+        dataset.X_gen.loc[:9, "color"] = "purple"
+
+        codes = dataset.encode_categories(dataset.X_gen)["color"]
+        assert codes.min() >= 0
+        assert (codes[:10] == len(levels)).all()
+
+        jsd = dataset.jensen_shannon_distance()
+        assert np.isfinite(jsd).all()
+        assert jsd["color"] > 0
+
+        # The extra code decodes as missing
+        decoded = dataset.decode_categories(dataset.encode_categories(dataset.X_gen))
+        assert decoded["color"][:10].isna().all()
+        assert decoded["color"][10:].notna().all()
+
+
+def test_jensen_shannon_extra_code_bin():
+    rng = np.random.default_rng(0)
+    P = rng.integers(0, 3, (200, 1)).astype(np.float32)
+    Q = P.copy()
+    Q[0] = 3
+
+    assert np.isfinite(_jensen_shannon_codes(P, Q)).all()
+
+
+if __name__ == "__main__":
+    test_unseen_generated_level()
+    test_jensen_shannon_extra_code_bin()